@@ -45,12 +45,13 @@ def evaluate():
     start_time = time.time()
     log = ''
     try:
-        format, v, gt_file, pred_file, log_, area, bbox, iou, filetype = parse_request(
+        format, v, gt_file, pred_file, log_, area, bbox, iou, filetype, projected, \
+            gt_filetype, pred_filetype = parse_request(
             flask.request)
     except Exception as e:
         return jsonify({'score': 0.0,
-                        'log': log + 'Invalid request:\n' + str(e)}),
-        400
+                        'log': log + 'Invalid request:\n' + str(e)}), \
+               400
     log += log_
     '''
     if (gt_file.filename[-4:].lower() == '.tif' or gt_file.filename[-5:].lower() == '.tiff') and \
@@ -66,14 +67,16 @@ def evaluate():
 
     if format == 'raster':
         try:
-            score, score_log = pixelwise_file_score(gt_file, pred_file, v, filetype)
+            score, score_log = pixelwise_file_score(gt_file, pred_file, v, filetype, projected,
+                                                     gt_filetype, pred_filetype)
         except Exception as e:
             return jsonify({'score': 0.0, 'log': log + str(e)}), 500
 
     elif format in ['vector', 'point']:
         try:
             score, score_log = objectwise_file_score(
-                gt_file, pred_file, area, format, v, iou=iou)
+                gt_file, pred_file, area, format, v, iou=iou, projected=projected,
+                pred_filetype=pred_filetype)
         except Exception as e:
             return jsonify({'score': 0.0, 'log': log + str(e)}), 500
 
@@ -95,6 +98,19 @@ def parse_request(request):
 
     format = request.args.get('format')
     filetype = request.args.get('filetype', default='tif')
+    # gt and pred may be of different types, then one of them is converted while scoring
+    if format == 'raster':
+        gt_filetype = request.args.get('gt_filetype', default=filetype)
+        pred_filetype = request.args.get('pred_filetype', default=filetype)
+    else:
+        # objectwise gt is always geojson, the raster prediction is polygonized
+        gt_filetype = request.args.get('gt_filetype', default='geojson')
+        pred_filetype = request.args.get('pred_filetype', default='geojson')
+        if gt_filetype != 'geojson':
+            raise Exception('Invalid request. Groundtruth must be geojson for vector and point formats')
+    for t in [filetype, gt_filetype, pred_filetype]:
+        if t not in ['tif', 'geojson']:
+            raise Exception('Invalid request. Unsupported filetype ' + str(t) + ', expected: tif/geojson')
 
     if format == 'vector':
         try:
@@ -107,6 +123,8 @@ def parse_request(request):
     else:
         iou = None
     v = request.args.get('v') in ['True', 'true', 'yes', 'Yes', 'y', 'Y']
+    # compute geometry in the local UTM projection instead of lat-lon
+    projected = request.args.get('projected') in ['True', 'true', 'yes', 'Yes', 'y', 'Y']
 
     # area is preferred over bbox, so if both are specified, area overrides bbox
     area = None
@@ -137,7 +155,7 @@ def parse_request(request):
     gt_file = request.files['gt']
     pred_file = request.files['pred']
 
-    return format, v, gt_file, pred_file, log, area, bbox, iou, filetype
+    return format, v, gt_file, pred_file, log, area, bbox, iou, filetype, projected, gt_filetype, pred_filetype
 
 
 
@@ -1,13 +1,22 @@
+import rtree
 import geojson
 import rasterio
 import numpy as np
+from affine import Affine
+from rasterio.windows import Window
+from rasterio.features import shapes, rasterize
+from shapely.ops import unary_union
+from shapely.affinity import affine_transform
+from shapely.geometry import MultiPolygon, shape
 
-from raster import pixelwise_raster_f1
+from raster import pixelwise_raster_f1, pixelwise_counts_f1
 from vector import pixelwise_vector_f1, objectwise_f1_score
-from proc import get_geom, cut_by_area
+from proc import get_geom, get_local_crs, reproject, cut_by_area, LATLON_CRS
 
 
 EPS = 0.00000001
+# size of the raster windows in the format conversion stage
+WINDOW_SIZE = 1024
 
 
 # ================= PIXELWISE F1 ================================
@@ -15,35 +24,54 @@ EPS = 0.00000001
 def pixelwise_file_score(gt_file,
                          pred_file,
                          v: bool = False,
-                         filetype='tif'):
+                         filetype='tif',
+                         projected: bool = False,
+                         gt_filetype=None,
+                         pred_filetype=None):
     """
 
     :param gt_file:
     :param pred_file:
     :param v:
+    :param filetype:
+    :param projected: if True, the geojson areas are calculated in the local UTM projection instead of lat-lon
+    :param gt_filetype: 'tif' or 'geojson', overrides filetype for the groundtruth
+    :param pred_filetype: 'tif' or 'geojson', overrides filetype for the prediction
     :return:
     """
+    gt_filetype = gt_filetype or filetype
+    pred_filetype = pred_filetype or filetype
+    if gt_filetype != pred_filetype:
+        return pixelwise_mixed_file_score(gt_file, pred_file, gt_filetype == 'geojson', v)
+
     log = ''
-    if filetype == 'geojson':
+    if gt_filetype == 'geojson':
+        try:
+            gt = geojson.load(gt_file)
+            dst_crs = get_local_crs(gt) if projected else LATLON_CRS
+            if v and projected:
+                log += "Using local projection " + dst_crs + "\n"
+        except Exception as e:
+            raise Exception(log + 'Failed to read groundtruth file as geojson\n' + str(e))
+
         try:
             pred = geojson.load(pred_file)
-            pred_polygons = get_geom(pred, 'vector')
+            pred_polygons = get_geom(pred, 'vector', dst_crs)
             if v:
                 log += "Read predicted geojson, contains " + str(len(pred_polygons)) + " objects \n"
         except Exception as e:
             raise Exception(log + 'Failed to read prediction file as geojson\n' + str(e))
 
         try:
-            gt = geojson.load(gt_file)
             # GT is always as polygons, not points
-            gt_polygons = get_geom(gt, 'vector')
+            gt_polygons = get_geom(gt, 'vector', dst_crs)
             if v:
                 log += "Read groundtruth geojson, contains " + str(len(gt_polygons)) + " polygons \n"
         except Exception as e:
             raise Exception(log + 'Failed to read groundtruth file as geojson\n' + str(e))
         score, score_log = pixelwise_vector_f1(gt_polygons, pred_polygons, v)
 
-    else: # tif or any other (default) value
+    else: # tif, other values are rejected by the server request parsing
         try:
             with rasterio.open(gt_file) as src:
                 gt_img = src.read(1)
@@ -62,41 +90,95 @@ def pixelwise_file_score(gt_file,
     return score, log + score_log
 
 
+def pixelwise_mixed_file_score(gt_file, pred_file, gt_is_vector: bool, v: bool = False):
+    """
+    Pixelwise score for one geojson and one raster file. The geojson is rasterized window by window
+    onto the grid of the raster, so neither of the images is read as a whole
+
+    :param gt_file:
+    :param pred_file:
+    :param gt_is_vector: True if gt is geojson and pred is raster, False if vice versa
+    :param v:
+    :return:
+    """
+    log = ''
+    vector_file, raster_file = (gt_file, pred_file) if gt_is_vector else (pred_file, gt_file)
+    try:
+        vector = geojson.load(vector_file)
+    except Exception as e:
+        raise Exception(log + 'Failed to read ' + ('groundtruth' if gt_is_vector else 'prediction') +
+                        ' file as geojson\n' + str(e))
+    try:
+        with rasterio.open(raster_file) as src:
+            polygons = get_geom(vector, 'vector', _raster_crs(src))
+            if v:
+                log += "Read geojson, contains " + str(len(polygons)) + " polygons, " \
+                       "rasterizing it to image of size " + str(src.width) + ', ' + str(src.height) + "\n"
+            both, raster_only, vector_only = rasterized_counts(src, polygons)
+    except Exception as e:
+        raise Exception(log + 'Failed to rasterize geojson onto the raster file\n' + str(e))
+
+    if gt_is_vector:
+        score, score_log = pixelwise_counts_f1(both, vector_only, raster_only, v)
+    else:
+        score, score_log = pixelwise_counts_f1(both, raster_only, vector_only, v)
+    return score, log + score_log
+
+
 
 # ==================================== OBJECTWISE F1 ============================================
 
 
-def objectwise_file_score(gt_file, pred_file, area, format, v: bool=True, iou=0.5):
+def objectwise_file_score(gt_file, pred_file, area, format, v: bool=True, iou=0.5, projected: bool=False,
+                          pred_filetype='geojson'):
     '''
     All the work with vector data, either in object or in point score
     :param gt_file:
     :param pred_file:
-    :param area:
+    :param area: list of polygons in lat-lon
     :param format:
     :param v:
     :param iou:
+    :param projected: if True, the geometries are compared in the local UTM projection instead of lat-lon
+    :param pred_filetype: 'geojson' or 'tif', the raster prediction is polygonized
     :return:
     '''
     log = ''
     try:
         gt = geojson.load(gt_file)
+        # the projection is chosen once by the groundtruth and used for all the data
+        dst_crs = get_local_crs(gt) if projected else LATLON_CRS
+        if v and projected:
+            log += "Using local projection " + dst_crs + "\n"
         # GT is always as polygons, not points
-        gt_polygons = get_geom(gt, 'vector')
+        gt_polygons = get_geom(gt, 'vector', dst_crs)
         if v:
             log += "Read groundtruth geojson, contains " + str(len(gt_polygons)) + " polygons \n"
     except Exception as e:
         raise Exception(log + 'Failed to read geojson groundtruth file\n' + str(e))
 
-    try:
-        pred = geojson.load(pred_file)
-        pred_geom = get_geom(pred, format)
-        if v:
-            log += "Read predicted geojson, contains " + str(len(pred_geom)) + " objects \n"
-    except Exception as e:
-        raise Exception(log + 'Failed to read geojson prediction file\n' + str(e))
+    if pred_filetype == 'geojson':
+        try:
+            pred = geojson.load(pred_file)
+            pred_geom = get_geom(pred, format, dst_crs)
+            if v:
+                log += "Read predicted geojson, contains " + str(len(pred_geom)) + " objects \n"
+        except Exception as e:
+            raise Exception(log + 'Failed to read geojson prediction file\n' + str(e))
+    else:
+        try:
+            with rasterio.open(pred_file) as src:
+                pred_geom = polygonize_raster(src, dst_crs)
+            if format == 'point':
+                pred_geom = [poly.centroid for poly in pred_geom]
+            if v:
+                log += "Polygonized predicted image, contains " + str(len(pred_geom)) + " objects \n"
+        except Exception as e:
+            raise Exception(log + 'Failed to polygonize raster prediction file\n' + str(e))
 
     if area:
         try:
+            area = reproject(area, LATLON_CRS, dst_crs)
             gt_polygons = cut_by_area(gt_polygons, area)
             pred_geom = cut_by_area(pred_geom, area)
         except Exception as e:
@@ -114,3 +196,89 @@ def objectwise_file_score(gt_file, pred_file, area, format, v: bool=True, iou=0.
 
     return score, log + score_log
 
+
+
+# ==================================== FORMAT CONVERSION ========================================
+
+def _raster_crs(src):
+    if src.crs is None:
+        raise Exception('Raster file has no crs and cannot be compared with geojson')
+    return src.crs.to_string()
+
+
+def _iter_windows(src, window_size=WINDOW_SIZE):
+    for row in range(0, src.height, window_size):
+        for col in range(0, src.width, window_size):
+            yield Window(col, row, min(window_size, src.width - col), min(window_size, src.height - row))
+
+
+def polygonize_raster(src, dst_crs=LATLON_CRS, window_size=WINDOW_SIZE):
+    """
+    Polygonizes the mask (all the pixels > 0) window by window.
+    The objects cut by the window boundaries are stitched back together
+
+    :param src: opened rasterio dataset
+    :param dst_crs: crs of the output polygons
+    :param window_size: size of the window in pixels
+    :return: list of shapely Polygons
+    """
+    src_crs = _raster_crs(src)
+    polygons = []
+    boundary = []
+    for window in _iter_windows(src, window_size):
+        mask = (src.read(1, window=window) > 0).astype(np.uint8)
+        # polygons are made in pixel coordinates of the whole image,
+        # so that the edges shared by the neighboring windows match exactly
+        offset = Affine.translation(window.col_off, window.row_off)
+        for geom, _ in shapes(mask, mask=mask, transform=offset):
+            polygon = shape(geom)
+            minx, miny, maxx, maxy = polygon.bounds
+            if (0 < window.col_off == minx or 0 < window.row_off == miny or
+                    src.width > window.col_off + window.width == maxx or
+                    src.height > window.row_off + window.height == maxy):
+                boundary.append(polygon)
+            else:
+                polygons.append(polygon)
+
+    if boundary:
+        stitched = unary_union(boundary)
+        if isinstance(stitched, MultiPolygon):
+            polygons += list(stitched.geoms)
+        else:
+            polygons += [stitched]
+
+    t = src.transform
+    polygons = [affine_transform(polygon, [t.a, t.b, t.d, t.e, t.c, t.f]) for polygon in polygons]
+    return reproject(polygons, src_crs, dst_crs)
+
+
+def rasterized_counts(src, polygons, window_size=WINDOW_SIZE):
+    """
+    Rasterizes the polygons window by window onto the grid of the raster
+    and counts the pixels of the raster mask (all the pixels > 0) and the rasterized polygons
+
+    :param src: opened rasterio dataset
+    :param polygons: list of shapely Polygons in the crs of the raster
+    :param window_size: size of the window in pixels
+    :return: pixel counts in both masks, only in the raster mask and only in the rasterized polygons
+    """
+    index = rtree.index.Index()
+    for i, polygon in enumerate(polygons):
+        index.insert(i, polygon.bounds)
+
+    both = raster_only = vector_only = 0
+    for window in _iter_windows(src, window_size):
+        raster_mask = src.read(1, window=window) > 0
+        left, bottom, right, top = rasterio.windows.bounds(window, src.transform)
+        candidates = [polygons[i] for i in index.intersection((min(left, right), min(bottom, top),
+                                                               max(left, right), max(bottom, top)))]
+        if candidates:
+            vector_mask = rasterize(candidates, out_shape=raster_mask.shape,
+                                    transform=src.window_transform(window), dtype=np.uint8) > 0
+        else:
+            vector_mask = np.zeros(raster_mask.shape, dtype=bool)
+        tp = int(np.logical_and(raster_mask, vector_mask).sum())
+        both += tp
+        raster_only += int(raster_mask.sum()) - tp
+        vector_only += int(vector_mask.sum()) - tp
+    return both, raster_only, vector_only
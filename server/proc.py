@@ -1,12 +1,85 @@
 import geojson
+from functools import lru_cache
 from typing import List
-from rasterio.warp import transform_geom
-from shapely.geometry import MultiPolygon, Polygon, Point,  asShape
+from pyproj import Transformer
+from shapely.ops import transform
+from shapely.geometry import MultiPolygon, Polygon, Point, shape
 
 # Vector preprocessing functions
 
-def get_geom(json, format):
-    """ Extracts all the polygons from the geojson object and reproject them to lat-lon crs
+# default crs of all the vector data, also the crs of the area and bbox specified in request
+LATLON_CRS = 'EPSG:4326'
+# geometry types extracted from geojson, the rest are ignored
+GEOM_TYPES = (geojson.MultiPolygon, geojson.Polygon, geojson.Point)
+
+
+@lru_cache(maxsize=None)
+def get_transformer(src_crs, dst_crs):
+    """ Returns the transformer between two crs. The transformers are cached by (src, dst) pair,
+    so that the crs definitions are resolved only once and not for every feature
+
+    :param src_crs: source crs, any string accepted by pyproj, e.g. 'EPSG:3857'
+    :param dst_crs: destination crs
+    :return: pyproj.Transformer, with (x, y) = (lon, lat) axis order for geographic crs
+    """
+    return Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
+
+def get_crs(json):
+    """ Extracts the crs name from the geojson object
+    the crs may be specified by the geojson standard or as 'crs':'EPSG:____', we should accept both
+
+    :param json: Input json structure
+    :return: crs name string
+    """
+    if isinstance(json['crs'], str):
+        return json['crs']
+    else:
+        return json['crs']['properties']['name']
+
+
+def get_local_crs(json):
+    """ Chooses the local metric crs (UTM zone) for the dataset by the center of its bounding box.
+    It is supposed to be called once for the dataset (normally for the groundtruth),
+    and then all the geometries are projected there, so that IoU and areas are calculated in meters
+
+    :param json: Input json structure
+    :return: crs name string, 'EPSG:326__' for the northern and 'EPSG:327__' for the southern hemisphere,
+        or lat-lon crs if the dataset has no coordinates
+    """
+    # the extent is calculated only by the geometries which are used by get_geom
+    coords = [(c[0], c[1])
+              for f in json.features if isinstance(f.geometry, GEOM_TYPES)
+              for c in geojson.utils.coords(f.geometry)]
+    if not coords:
+        # nothing to project, the score of the empty dataset does not depend on crs
+        return LATLON_CRS
+    xs, ys = zip(*coords)
+    lon, lat = get_transformer(get_crs(json), LATLON_CRS).transform((min(xs) + max(xs)) / 2,
+                                                                    (min(ys) + max(ys)) / 2)
+    zone = min(int((lon + 180) // 6) + 1, 60)
+    if lat >= 0:
+        return 'EPSG:' + str(32600 + zone)
+    else:
+        return 'EPSG:' + str(32700 + zone)
+
+
+def reproject(geoms, src_crs, dst_crs):
+    """ Reprojects the list of shapely geometries, e.g. area of interest, to another crs
+
+    :param geoms: list of shapely geometries
+    :param src_crs: crs of the geometries
+    :param dst_crs: target crs
+    :return: list of reprojected geometries
+    """
+    if src_crs == dst_crs:
+        return geoms
+    transformer = get_transformer(src_crs, dst_crs)
+    return [transform(transformer.transform, geom) for geom in geoms]
+
+
+def get_geom(json, format, dst_crs=LATLON_CRS):
+    """ Extracts all the polygons from the geojson object and reproject them to dst_crs (lat-lon by default)
     The lines are ignored, while multipolygons are divided into individual polygons and concatenated
     with polygons list.
     If format == 'point', al the points are extracted, and for every polygon its centroid is returned
@@ -14,54 +87,30 @@ def get_geom(json, format):
     :param json: Input json structure
     :param format: 'vector' or 'point', represents return data type
     # TODO: refactor - change this param name
+    :param dst_crs: crs of the output geometries, e.g. the one returned by get_local_crs
     :return: list of geometries
     """
     polys = []  # type: List[Polygon]
     points = [] # type: List[Point]
 
-    # the crs may be specified by the geojson standard or as 'crs':'EPSG:____', we should accept both
-    if isinstance(json['crs'], str):
-        src_crs = json['crs']
-    else:
-        src_crs = json['crs']['properties']['name']
-
-    # then we will reproject all to lat-lon (EPSG:4326)
-    dst_crs = 'EPSG:4326'
+    src_crs = get_crs(json)
+    # the transformer is resolved once for the whole file
+    transformer = get_transformer(src_crs, dst_crs)
 
     for f in json.features:
-        if isinstance(f.geometry, geojson.MultiPolygon):
-            try:
-                new_geom = transform_geom(src_crs=src_crs,
-                                          dst_crs=dst_crs,
-                                          geom=f.geometry)
-            except ValueError:
-                # we ignore the invalid geometries
-                continue
-            # transform_geom outputs an instance of Polygon, if the input is a MultiPolygon with one contour
-            if new_geom['type'] == 'Polygon':
-                polys += [asShape(new_geom)]
-            else:
-                polys += [asShape(geojson.Polygon(c)) for c in new_geom['coordinates']]
-        elif isinstance(f.geometry, geojson.Polygon):
-            try:
-                new_geom = transform_geom(src_crs=src_crs,
-                                          dst_crs=dst_crs,
-                                          geom=f.geometry)
-            except ValueError:
-                # we ignore the invalid geometries
-                continue
-            polys += [asShape(new_geom)]
-        elif isinstance(f.geometry, geojson.Point):
-            try:
-                new_geom = transform_geom(src_crs=src_crs,
-                                          dst_crs=dst_crs,
-                                          geom=f.geometry)
-            except ValueError:
-                # we ignore the invalid geometries
-                continue
-            points += [asShape(new_geom)]
+        if not isinstance(f.geometry, GEOM_TYPES):
+            continue # raise Exception("Unexpected FeatureType:\n" + f.geometry['type'] + "\nExpected Polygon or MultiPolygon")
+        try:
+            new_geom = transform(transformer.transform, shape(f.geometry))
+        except ValueError:
+            # we ignore the invalid geometries
+            continue
+        if isinstance(new_geom, MultiPolygon):
+            polys += list(new_geom.geoms)
+        elif isinstance(new_geom, Polygon):
+            polys += [new_geom]
         else:
-            pass # raise Exception("Unexpected FeatureType:\n" + f.geometry['type'] + "\nExpected Polygon or MultiPolygon")
+            points += [new_geom]
 
     if format == 'vector':
         return polys
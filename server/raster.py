@@ -8,7 +8,6 @@ def pixelwise_raster_f1(groundtruth_array, predicted_array, v: bool=False):
     :param v: is_verbose
     :return: float, f1-score and string, log
     """
-    log = ''
     assert groundtruth_array.shape == predicted_array.shape, "Images has different sizes"
     groundtruth_array[groundtruth_array > 0] = 1
     predicted_array[predicted_array > 0] = 1
@@ -16,6 +15,19 @@ def pixelwise_raster_f1(groundtruth_array, predicted_array, v: bool=False):
     tp = np.logical_and(groundtruth_array, predicted_array).sum()
     fn = int(groundtruth_array.sum() - tp)
     fp = int(predicted_array.sum() - tp)
+    return pixelwise_counts_f1(tp, fn, fp, v)
+
+
+def pixelwise_counts_f1(tp, fn, fp, v: bool=False):
+    """
+    Calculates f1-score from the pixel counts, e.g. accumulated over the windows of a large image
+    :param tp: true positive pixels
+    :param fn: false negative pixels
+    :param fp: false positive pixels
+    :param v: is_verbose
+    :return: float, f1-score and string, log
+    """
+    log = ''
     if tp == 0:
         f1 = 0
     else:
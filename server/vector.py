@@ -1,4 +1,5 @@
 import rtree
+import heapq
 from typing import List
 
 from shapely.wkb import dumps, loads
@@ -79,19 +80,228 @@ def objectwise_f1_score(gt: List[Polygon],
                      [groundtruth_rtree_index]*len(pred)))
     fp = len(pred) - tp
     fn = len(gt) - tp
-    # to avoid zero-division
-    if tp == 0:
-        f1 = 0.
-    else:
-        precision = tp / (tp + fp)
-        recall = tp / (tp + fn)
-        f1 = 2 * (precision * recall) / (precision + recall)
+    f1 = _f1(tp, fp, fn)
     if v:
         log += 'True Positive = ' + str(tp) + ', False Negative = ' + str(fn) + ', False Positive = ' + str(fp) + '\n'
 
     return f1, log
 
 
+class ObjectwiseScoreSession:
+    """
+    Keeps the groundtruth index and the matches between the objects between the calls,
+    so that the objectwise f1-score can be updated when only a part of the prediction changes.
+
+    The matching is the same greedy matching as in objectwise_f1_score with the predictions taken
+    in the order of their ids, so the score is equal to objectwise_f1_score(gt, pred) for the predictions
+    sorted by id. After every update only the changed predictions are re-matched, and the re-matching
+    spreads further only to the predictions with higher ids competing for a groundtruth object whose match
+    has changed.
+
+    The session is used from python only, it is not available through the server api.
+
+    :param gt: list of shapely Polygons, represents ground truth;
+    :param pred: list of shapely Polygons or Points (according to the 'format' param), initial prediction;
+    :param format: 'vector' or 'point', means format of prediction and corresponding variant of algorithm;
+    :param iou: minimum IoU that is required for the polygon to be considered positive example
+    """
+    def __init__(self, gt: List[Polygon], pred=(), format='vector', iou=0.5):
+        self.format = format
+        self.iou = iou
+        # buffer(0) is done once here instead of every comparison
+        self._gt = [polygon.buffer(0) for polygon in gt]
+        self._gt_index = rtree.index.Index()
+        for i, polygon in enumerate(gt):
+            self._gt_index.insert(i, polygon.bounds)
+        self._pred = {}
+        self._pred_index = rtree.index.Index()
+        self._next_id = 0
+        # pred id -> gt id and back
+        self._pred_match = {}
+        self._gt_match = {}
+        self.add(pred)
+
+    @property
+    def tp(self):
+        return len(self._pred_match)
+
+    @property
+    def fp(self):
+        return len(self._pred) - self.tp
+
+    @property
+    def fn(self):
+        return len(self._gt) - self.tp
+
+    @property
+    def pred_ids(self):
+        return sorted(self._pred)
+
+    def score(self, v: bool=True):
+        """
+        :param v: is_verbose
+        :return: float, f1-score and string, log
+        """
+        log = ''
+        if v:
+            log += 'True Positive = ' + str(self.tp) + ', False Negative = ' + str(self.fn) + \
+                   ', False Positive = ' + str(self.fp) + '\n'
+        return _f1(self.tp, self.fp, self.fn), log
+
+    def add(self, pred):
+        """
+        Adds the predicted objects
+        :param pred: list of shapely Polygons or Points
+        :return: list of ids assigned to the new objects
+        """
+        ids = list(range(self._next_id, self._next_id + len(pred)))
+        self.update(added=dict(zip(ids, pred)))
+        return ids
+
+    def remove(self, ids):
+        """
+        Removes the predicted objects
+        :param ids: ids of the objects, as returned by add
+        """
+        self.update(removed=ids)
+
+    def modify(self, modified):
+        """
+        Replaces the geometry of the predicted objects
+        :param modified: dict {id: new geometry}
+        """
+        self.update(modified=modified)
+
+    def replace_region(self, area, pred):
+        """
+        Replaces all the predicted objects within the region (e.g. a tile) by the new ones.
+        The object belongs to the region if its representative point lies within the region,
+        so that the objects crossing the region boundary are not counted twice
+        :param area: shapely Polygon, the region
+        :param pred: list of new shapely Polygons or Points within the region
+        :return: list of ids assigned to the new objects
+        """
+        area = area.buffer(0)
+        removed = [i for i in self._pred_index.intersection(area.bounds)
+                   if area.intersects(self._pred[i].representative_point())]
+        ids = list(range(self._next_id, self._next_id + len(pred)))
+        self.update(added=dict(zip(ids, pred)), removed=removed)
+        return ids
+
+    def update(self, added=None, removed=(), modified=None):
+        """
+        Applies the changes of the prediction and re-matches the affected neighborhood
+        :param added: dict {new id: geometry}
+        :param removed: ids of the objects to be removed
+        :param modified: dict {id: new geometry}
+        """
+        added = added or {}
+        modified = modified or {}
+        # all the ids are checked before any change, so that a failed update leaves the session intact
+        changed_ids = list(removed) + list(modified)
+        for i in changed_ids:
+            if i not in self._pred:
+                raise KeyError('Unknown prediction id ' + str(i))
+        if len(set(changed_ids)) != len(changed_ids):
+            raise KeyError('Prediction ids are repeated in removed and modified')
+        for i in added:
+            if i in self._pred:
+                raise KeyError('Prediction id ' + str(i) + ' already exists')
+        new_geoms = [(i, geom if self.format == 'point' else geom.buffer(0))
+                     for i, geom in list(added.items()) + list(modified.items())]
+
+        dirty = []
+        for i in changed_ids:
+            j = self._pred_match.get(i)
+            self._unmatch_pred(i)
+            self._pred_index.delete(i, self._pred[i].bounds)
+            del self._pred[i]
+            if j is not None:
+                dirty += self._competitors(j, i)
+        for i, geom in new_geoms:
+            self._pred[i] = geom
+            self._pred_index.insert(i, geom.bounds)
+            dirty.append(i)
+            self._next_id = max(self._next_id, i + 1)
+        self._rematch(dirty)
+
+    def _unmatch_pred(self, i):
+        if i in self._pred_match:
+            del self._gt_match[self._pred_match.pop(i)]
+
+    def _competitors(self, j, i):
+        # predictions after i which may take the groundtruth object j, when it is released by i
+        return [k for k in self._pred_index.intersection(self._gt[j].bounds) if k > i]
+
+    def _rematch(self, dirty):
+        # the predictions are re-matched in the order of ids, as in the full greedy matching;
+        # new dirty predictions always have higher ids than the current one, so every prediction
+        # is re-matched at most once and sees the final matches of all the preceding predictions
+        queued = set(dirty)
+        heap = list(queued)
+        heapq.heapify(heap)
+        while heap:
+            i = heapq.heappop(heap)
+            queued.discard(i)
+            if i not in self._pred:
+                continue
+            old = self._pred_match.get(i)
+            new = self._find_match(i)
+            if new == old:
+                continue
+            changed = []
+            if old is not None:
+                self._unmatch_pred(i)
+                changed += self._competitors(old, i)
+            if new is not None:
+                # the object may be taken from a prediction with higher id, which is re-matched then
+                k = self._gt_match.get(new)
+                if k is not None:
+                    self._unmatch_pred(k)
+                    changed.append(k)
+                self._pred_match[i] = new
+                self._gt_match[new] = i
+            for k in changed:
+                if k not in queued:
+                    queued.add(k)
+                    heapq.heappush(heap, k)
+
+    def _is_available(self, j, i):
+        # in the greedy matching the prediction i can take any object not taken by the preceding predictions
+        return self._gt_match.get(j, i) >= i
+
+    def _find_match(self, i):
+        geom = self._pred[i]
+        if self.format == 'point':
+            for j in sorted(self._gt_index.intersection((geom.x, geom.y))):
+                if self._is_available(j, i) and self._gt[j].contains(geom):
+                    return j
+            return None
+
+        best_iou = 0
+        best_j = None
+        for j in sorted(self._gt_index.intersection(geom.bounds)):
+            if not self._is_available(j, i):
+                continue
+            candidate = self._gt[j]
+            metric = geom.intersection(candidate).area / geom.union(candidate).area
+            if metric > best_iou:
+                best_iou = metric
+                best_j = j
+        if best_iou > self.iou:
+            return best_j
+        return None
+
+
+def _f1(tp, fp, fn):
+    # to avoid zero-division
+    if tp == 0:
+        return 0.
+    precision = tp / (tp + fp)
+    recall = tp / (tp + fn)
+    return 2 * (precision * recall) / (precision + recall)
+
+
 def _has_match_rtree(polygon_serialized, iou_threshold, groundtruth_rtree_index):
     """ Compares the polygon with the rtree index whether it has a matching indexed polygon,
     and deletes the match if it is found
@@ -103,13 +313,13 @@ def _has_match_rtree(polygon_serialized, iou_threshold, groundtruth_rtree_index)
     polygon = loads(polygon_serialized)
     best_iou = 0
     best_item = None
-    candidate_items = [
-        candidate_item
-        for candidate_item
-        in groundtruth_rtree_index.intersection(
+    # the candidates are sorted by id, so that on equal IoU the result does not depend on the rtree order
+    candidate_items = sorted(
+        groundtruth_rtree_index.intersection(
             polygon.bounds, objects=True
-        )
-    ]
+        ),
+        key=lambda item: item.id
+    )
 
     for item in candidate_items:
         candidate = loads(item.get_object(loads))
@@ -133,13 +343,14 @@ def _lies_within_rtree(point, groundtruth_rtree_index):
     :param groundtruth_rtree_index: rtree index
     :return: True if match found, False otherwise
     """
-    candidate_items = [
-        candidate_item
-        for candidate_item
-        in groundtruth_rtree_index.intersection(
+    # the candidates are sorted by id, so that the point within overlapping polygons
+    # is matched with the first one regardless of the rtree order
+    candidate_items = sorted(
+        groundtruth_rtree_index.intersection(
             (point.x, point.y), objects=True
-        )
-    ]
+        ),
+        key=lambda item: item.id
+    )
     for item in candidate_items:
         candidate = loads(item.get_object(loads))
         if candidate.contains(point):
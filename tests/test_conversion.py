@@ -0,0 +1,101 @@
+import unittest as unittest
+
+import geojson
+import rasterio
+from rasterio.features import shapes
+from shapely.geometry import shape
+from shapely.ops import unary_union
+from shapely.affinity import translate
+
+from proc import get_geom
+from f1_calc import polygonize_raster, rasterized_counts, pixelwise_file_score, objectwise_file_score
+
+# 150x100 mask in EPSG:32611 with a long stripe, objects on the window corners, a polygon with a hole,
+# an L-shape and diagonally touching pixels; the geojson contains the same 8 objects
+TIF_FILE = 'tests/data/synthetic/mask.tif'
+GEOJSON_FILE = 'tests/data/synthetic/mask.geojson'
+CRS = 'EPSG:32611'
+WINDOW_SIZES = [1024, 100, 37, 16]
+
+
+class TestPolygonize(unittest.TestCase):
+
+    def setUp(self):
+        with rasterio.open(TIF_FILE) as src:
+            mask = src.read(1)
+            self.whole = [shape(geom) for geom, _ in shapes(mask, mask=mask, transform=src.transform)]
+
+    def test_polygonize_windows(self):
+        for window_size in WINDOW_SIZES:
+            with rasterio.open(TIF_FILE) as src:
+                polygons = polygonize_raster(src, CRS, window_size=window_size)
+            self.assertEqual(len(polygons), len(self.whole))
+            self.assertAlmostEqual(sum(p.area for p in polygons), sum(p.area for p in self.whole))
+            self.assertAlmostEqual(unary_union(polygons).symmetric_difference(unary_union(self.whole)).area, 0)
+
+    def test_polygonize_stripe(self):
+        # the stripe crosses all the vertical window edges and must be stitched into one object
+        with rasterio.open(TIF_FILE) as src:
+            polygons = polygonize_raster(src, CRS, window_size=16)
+        self.assertEqual(max(p.area for p in polygons), 146 * 4)
+
+
+class TestRasterize(unittest.TestCase):
+
+    def setUp(self):
+        with open(GEOJSON_FILE) as src:
+            self.polygons = get_geom(geojson.load(src), 'vector', CRS)
+        with rasterio.open(TIF_FILE) as src:
+            self.mask_sum = int((src.read(1) > 0).sum())
+
+    def test_rasterized_counts_windows(self):
+        for window_size in WINDOW_SIZES:
+            with rasterio.open(TIF_FILE) as src:
+                counts = rasterized_counts(src, self.polygons, window_size=window_size)
+            self.assertEqual(counts, (self.mask_sum, 0, 0))
+
+    def test_rasterized_counts_shifted(self):
+        # all the polygons shifted by 1 pixel right
+        shifted = [translate(p, 1, 0) for p in self.polygons]
+        with rasterio.open(TIF_FILE) as src:
+            expected = rasterized_counts(src, shifted, window_size=1024)
+            for window_size in WINDOW_SIZES[1:]:
+                self.assertEqual(rasterized_counts(src, shifted, window_size=window_size), expected)
+        self.assertGreater(expected[1], 0)
+        self.assertGreater(expected[2], 0)
+
+
+class TestMixedScore(unittest.TestCase):
+
+    def test_pixelwise_vector_gt(self):
+        with open(GEOJSON_FILE) as gt_file:
+            score, _ = pixelwise_file_score(gt_file, TIF_FILE, gt_filetype='geojson', pred_filetype='tif')
+        self.assertAlmostEqual(score, 1.0)
+
+    def test_pixelwise_raster_gt(self):
+        with open(GEOJSON_FILE) as pred_file:
+            score, _ = pixelwise_file_score(TIF_FILE, pred_file, gt_filetype='tif', pred_filetype='geojson')
+        self.assertAlmostEqual(score, 1.0)
+
+    def test_objectwise_raster_pred(self):
+        # the polygonized prediction scores as the same prediction in geojson
+        # (for points it is below 1, since the centroids of the L-shape and the holed polygon lie outside them)
+        for format in ['vector', 'point']:
+            with open(GEOJSON_FILE) as gt_file, open(GEOJSON_FILE) as pred_file:
+                expected, _ = objectwise_file_score(gt_file, pred_file, None, format)
+            for projected in [False, True]:
+                with open(GEOJSON_FILE) as gt_file:
+                    score, _ = objectwise_file_score(gt_file, TIF_FILE, None, format,
+                                                     projected=projected, pred_filetype='tif')
+                self.assertAlmostEqual(score, expected)
+        self.assertAlmostEqual(expected, 0.75)
+
+    def test_raster_without_crs(self):
+        with open(GEOJSON_FILE) as gt_file, rasterio.open(TIF_FILE) as src, \
+                rasterio.MemoryFile() as memfile:
+            profile = src.profile
+            profile.pop('crs')
+            with memfile.open(**profile) as dst:
+                dst.write(src.read())
+            with self.assertRaisesRegex(Exception, 'no crs'):
+                pixelwise_file_score(gt_file, memfile.name, gt_filetype='geojson', pred_filetype='tif')
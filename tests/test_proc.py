@@ -0,0 +1,72 @@
+import io
+import unittest as unittest
+
+import geojson
+from rasterio.warp import transform_geom
+from shapely.geometry import shape
+
+from proc import get_geom, get_local_crs, LATLON_CRS
+from vector import objectwise_f1_score
+from f1_calc import objectwise_file_score, pixelwise_file_score
+
+GT_FILE = 'tests/data/ventura/ventura_class_801.geojson'
+PRED_FILE = 'tests/data/ventura/ventura_class_801_pred.geojson'
+
+
+class TestGetGeom(unittest.TestCase):
+
+    def setUp(self):
+        with open(GT_FILE) as src:
+            self.gt = geojson.load(src)
+        with open(PRED_FILE) as src:
+            self.pred = geojson.load(src)
+
+    def test_get_geom_count(self):
+        self.assertEqual(len(get_geom(self.gt, 'vector')), 321)
+        self.assertEqual(len(get_geom(self.pred, 'vector')), 307)
+
+    def test_get_geom_latlon_as_transform_geom(self):
+        # the default dst_crs keeps the results of the previous rasterio transform_geom implementation
+        polygons = get_geom(self.pred, 'vector')
+        for f, polygon in zip(self.pred.features, polygons):
+            expected = shape(transform_geom(src_crs='EPSG:3857', dst_crs=LATLON_CRS, geom=f.geometry))
+            self.assertTrue(polygon.equals_exact(expected, 1e-6))
+
+    def test_get_geom_objectwise_score(self):
+        gt_polygons = get_geom(self.gt, 'vector')
+        pred_polygons = get_geom(self.pred, 'vector')
+        score, _ = objectwise_f1_score(gt_polygons, pred_polygons, 'vector', iou=0.5)
+        self.assertAlmostEqual(score, 0.793, places=3)
+        pred_points = get_geom(self.pred, 'point')
+        score, _ = objectwise_f1_score(gt_polygons, pred_points, 'point')
+        self.assertAlmostEqual(score, 0.857, places=3)
+
+    def test_local_crs(self):
+        self.assertEqual(get_local_crs(self.gt), 'EPSG:32611')
+
+    def test_projected_score(self):
+        for projected in [False, True]:
+            with open(GT_FILE) as gt_file, open(PRED_FILE) as pred_file:
+                score, _ = objectwise_file_score(gt_file, pred_file, None, 'vector', projected=projected)
+            self.assertAlmostEqual(score, 0.793, places=3)
+            with open(GT_FILE) as gt_file, open(PRED_FILE) as pred_file:
+                score, _ = pixelwise_file_score(gt_file, pred_file, filetype='geojson', projected=projected)
+            self.assertAlmostEqual(score, 0.820, places=3)
+
+    def test_projected_empty_gt(self):
+        empty = geojson.FeatureCollection([], crs='EPSG:3857')
+        self.assertEqual(get_local_crs(empty), LATLON_CRS)
+        with open(PRED_FILE) as pred_file:
+            score, _ = objectwise_file_score(io.StringIO(geojson.dumps(empty)), pred_file, None, 'vector',
+                                             projected=True)
+        self.assertEqual(score, 0.)
+
+    def test_projected_null_geometry(self):
+        # features without geometry are skipped both by get_geom and get_local_crs
+        self.gt.features.append(geojson.Feature(geometry=None, properties={}))
+        self.assertEqual(get_local_crs(self.gt), 'EPSG:32611')
+        for projected in [False, True]:
+            with open(PRED_FILE) as pred_file:
+                score, _ = objectwise_file_score(io.StringIO(geojson.dumps(self.gt)), pred_file, None, 'vector',
+                                                 projected=projected)
+            self.assertAlmostEqual(score, 0.793, places=3)
@@ -0,0 +1,118 @@
+import random
+import unittest as unittest
+
+import geojson
+from shapely.affinity import translate
+from shapely.geometry import box
+
+from proc import get_geom, get_local_crs
+from vector import objectwise_f1_score, ObjectwiseScoreSession
+
+
+class TestObjectwiseScoreSession(unittest.TestCase):
+
+    def setUp(self):
+        with open('tests/data/ventura/ventura_class_801.geojson') as src:
+            gt = geojson.load(src)
+        with open('tests/data/ventura/ventura_class_801_pred.geojson') as src:
+            pred = geojson.load(src)
+        crs = get_local_crs(gt)
+        self.gt_polygons = get_geom(gt, 'vector', crs)
+        self.pred_polygons = get_geom(pred, 'vector', crs)
+
+    def assertSessionScore(self, session, gt, format):
+        pred = [session._pred[i] for i in session.pred_ids]
+        expected, _ = objectwise_f1_score(gt, pred, format, v=False)
+        self.assertAlmostEqual(session.score(v=False)[0], expected, places=12)
+
+    def assertFullScore(self, session, format):
+        self.assertSessionScore(session, self.gt_polygons, format)
+
+    def _random_edits(self, format, edits=200, check_every=10):
+        rnd = random.Random(0)
+        if format == 'vector':
+            pred = self.pred_polygons
+        else:
+            pred = [poly.centroid for poly in self.pred_polygons]
+        session = ObjectwiseScoreSession(self.gt_polygons, pred, format=format)
+        self.assertFullScore(session, format)
+
+        for k in range(1, edits + 1):
+            ids = session.pred_ids
+            action = rnd.choice(['add', 'remove', 'modify'])
+            if action == 'add':
+                # either a copy of gt or a shifted prediction, to produce both matches and misses
+                geom = rnd.choice(self.gt_polygons + self.pred_polygons)
+                geom = translate(geom, rnd.uniform(-2, 2), rnd.uniform(-2, 2))
+                session.add([geom if format == 'vector' else geom.centroid])
+            elif action == 'remove':
+                session.remove([rnd.choice(ids)])
+            else:
+                i = rnd.choice(ids)
+                session.modify({i: translate(session._pred[i], rnd.uniform(-3, 3), rnd.uniform(-3, 3))})
+            # full recompute is slow, so it is compared periodically
+            if k % check_every == 0:
+                self.assertFullScore(session, format)
+
+        bounds = self.gt_polygons[0].bounds
+        region = box(bounds[0] - 50, bounds[1] - 50, bounds[2] + 50, bounds[3] + 50)
+        new = self.gt_polygons[:3] if format == 'vector' else [poly.centroid for poly in self.gt_polygons[:3]]
+        session.replace_region(region, new)
+        self.assertFullScore(session, format)
+
+    def test_vector(self):
+        session = ObjectwiseScoreSession(self.gt_polygons, self.pred_polygons)
+        self.assertEqual((session.tp, session.fp, session.fn), (249, 58, 72))
+        self._random_edits('vector')
+
+    def test_point(self):
+        self._random_edits('point')
+
+    def test_overlapping_gt(self):
+        # the matching must not depend on the rtree order when a prediction has several candidates
+        for format in ['vector', 'point']:
+            for seed in range(30):
+                rnd = random.Random(seed)
+                gt = [box(x, y, x + rnd.uniform(2, 6), y + rnd.uniform(2, 6))
+                      for x, y in ((rnd.uniform(0, 20), rnd.uniform(0, 20)) for _ in range(15))]
+
+                def random_pred():
+                    geom = translate(rnd.choice(gt), rnd.uniform(-1, 1), rnd.uniform(-1, 1))
+                    return geom if format == 'vector' else geom.centroid
+
+                session = ObjectwiseScoreSession(gt, [random_pred() for _ in range(15)], format=format)
+                self.assertSessionScore(session, gt, format)
+                for _ in range(20):
+                    ids = session.pred_ids
+                    session.update(added={session._next_id: random_pred()},
+                                   removed=[rnd.choice(ids)])
+                    self.assertSessionScore(session, gt, format)
+
+    def test_tiled_gt_local_update(self):
+        # groundtruth sharing the walls: the update must not spread over the whole connected grid
+        gt = [box(x, y, x + 1, y + 1) for x in range(30) for y in range(30)]
+        pred = [translate(polygon, 0.1, 0.1) for polygon in gt]
+        session = ObjectwiseScoreSession(gt, pred)
+        calls = []
+        find_match = session._find_match
+        session._find_match = lambda i: calls.append(i) or find_match(i)
+        session.modify({450: translate(pred[450], 0.5, 0)})
+        self.assertLess(len(calls), 10)
+        session.remove([451])
+        self.assertLess(len(calls), 20)
+        self.assertSessionScore(session, gt, 'vector')
+
+    def test_failed_update(self):
+        session = ObjectwiseScoreSession(self.gt_polygons, self.pred_polygons)
+        matched = next(iter(session._pred_match))
+        before = (session.tp, session.fp, session.fn, session.pred_ids)
+        with self.assertRaises(KeyError):
+            session.update(removed=[matched], added={1: self.pred_polygons[1]})
+        with self.assertRaises(KeyError):
+            session.update(removed=[matched, matched])
+        with self.assertRaises(KeyError):
+            session.update(removed=[matched], modified={matched: self.pred_polygons[0]})
+        with self.assertRaises(KeyError):
+            session.update(removed=[matched, -1])
+        self.assertEqual((session.tp, session.fp, session.fn, session.pred_ids), before)
+        self.assertFullScore(session, 'vector')